@@ -0,0 +1,270 @@
+"""
+User-defined ECU functions
+This module compiles safe arithmetic expressions into cached evaluation kernels
+"""
+
+import ast
+import keyword
+import math
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+MAX_EXPRESSION_LENGTH = 1000
+
+# Deepest accepted operator nesting; validation and compilation recurse per level
+MAX_EXPRESSION_DEPTH = 100
+
+# Functions and constants an expression may reference
+ALLOWED_FUNCTIONS: Dict[str, Callable[..., float]] = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "atan2": math.atan2,
+    "hypot": math.hypot,
+    # math.floor/ceil return ints, which would reintroduce unbounded integer arithmetic
+    "floor": lambda value: float(math.floor(value)),
+    "ceil": lambda value: float(math.ceil(value)),
+}
+ALLOWED_CONSTANTS: Dict[str, float] = {
+    "pi": math.pi,
+    "e": math.e,
+}
+
+# Argument names the MCP server consumes itself, so functions cannot use them as inputs
+RESERVED_INPUT_NAMES = {"output_format"}
+
+_ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+
+# Kernels run without builtins; zip is bound under a name inputs cannot use
+_KERNEL_GLOBALS = {"__builtins__": {}, "_zip": zip, **ALLOWED_FUNCTIONS, **ALLOWED_CONSTANTS}
+
+
+class _ExpressionValidator(ast.NodeTransformer):
+    """
+    Reject anything but arithmetic on inputs, numeric constants and whitelisted calls.
+    Integer constants are turned into floats so constant folding cannot build huge integers.
+    """
+
+    def __init__(self, inputs: Sequence[str]):
+        self.inputs = set(inputs)
+
+    def visit_Expression(self, node: ast.Expression) -> ast.AST:
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        if not isinstance(node.op, _ALLOWED_BINOPS):
+            raise ValueError(f"Operator not allowed: {type(node.op).__name__}")
+        return self.generic_visit(node)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        if not isinstance(node.op, _ALLOWED_UNARYOPS):
+            raise ValueError(f"Operator not allowed: {type(node.op).__name__}")
+        return self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        if not isinstance(node.func, ast.Name) or node.func.id not in ALLOWED_FUNCTIONS:
+            raise ValueError(f"Function not allowed: {ast.unparse(node.func)}")
+        if node.keywords or not node.args:
+            raise ValueError(f"Invalid call to {node.func.id}()")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id not in self.inputs and node.id not in ALLOWED_CONSTANTS:
+            raise ValueError(f"Unknown name in expression: {node.id}")
+        return node
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if type(node.value) not in (int, float):
+            raise ValueError(f"Constant not allowed: {node.value!r}")
+        return ast.copy_location(ast.Constant(float(node.value)), node)
+
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        if not isinstance(node, (ast.BinOp, ast.UnaryOp, ast.operator, ast.unaryop)):
+            raise ValueError(f"Expression element not allowed: {type(node).__name__}")
+        return super().generic_visit(node)
+
+
+def _check_depth(tree: ast.AST) -> None:
+    # Iterative, so it cannot itself hit the recursion limit
+    stack = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > MAX_EXPRESSION_DEPTH:
+            raise ValueError(f"Expression nested deeper than {MAX_EXPRESSION_DEPTH} levels")
+        stack.extend((child, depth + 1) for child in ast.iter_child_nodes(node))
+
+
+def _validate_input_name(name: str) -> None:
+    if (
+        not isinstance(name, str)
+        or not name.isidentifier()
+        or keyword.iskeyword(name)
+        or name.startswith("_")
+        or name in ALLOWED_FUNCTIONS
+        or name in ALLOWED_CONSTANTS
+    ):
+        raise ValueError(f"Invalid input name: {name!r}")
+    if name in RESERVED_INPUT_NAMES:
+        raise ValueError(f"Input name is reserved: {name!r}")
+
+
+def parse_expression(expression: str, inputs: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+    """
+    Parse and validate an arithmetic expression.
+
+    Args:
+        expression: Expression such as "a * x + b"
+        inputs: Input names in call order; inferred in order of appearance if omitted
+
+    Returns:
+        Tuple of the canonical expression source and the input names
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise ValueError("Expression must be a non-empty string")
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters")
+
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression syntax: {e.msg}") from None
+    except (RecursionError, MemoryError):
+        raise ValueError("Expression is nested too deeply") from None
+    _check_depth(tree)
+
+    if inputs is None:
+        names = sorted(
+            (
+                node for node in ast.walk(tree)
+                if isinstance(node, ast.Name)
+                and node.id not in ALLOWED_FUNCTIONS
+                and node.id not in ALLOWED_CONSTANTS
+            ),
+            key=lambda node: (node.lineno, node.col_offset),
+        )
+        inputs = list(dict.fromkeys(node.id for node in names))
+    else:
+        if not isinstance(inputs, (list, tuple)):
+            raise ValueError("Inputs must be a list of names")
+        inputs = list(inputs)
+        if len(set(inputs)) != len(inputs):
+            raise ValueError("Duplicate input names")
+    for name in inputs:
+        _validate_input_name(name)
+
+    validator = _ExpressionValidator(inputs)
+    tree = validator.visit(tree)
+    return ast.unparse(tree), inputs
+
+
+@lru_cache(maxsize=256)
+def compile_kernel(source: str, inputs: Tuple[str, ...], array_mask: Tuple[bool, ...]) -> Callable[..., Any]:
+    """
+    Compile a validated expression into a kernel.
+
+    Inputs flagged in array_mask are iterated element-wise in a single list
+    comprehension; the others are broadcast as scalars. Kernels are cached
+    per (expression, inputs, mask), so every shape is compiled only once.
+
+    Args:
+        source: Canonical expression from parse_expression()
+        inputs: Input names in call order
+        array_mask: For each input, whether it is passed as an array
+
+    Returns:
+        Function taking the inputs positionally
+    """
+    params = ", ".join(inputs)
+    arrays = [name for name, is_array in zip(inputs, array_mask) if is_array]
+    if not arrays:
+        body = f"({source})"
+    elif len(arrays) == 1:
+        body = f"[({source}) for {arrays[0]} in {arrays[0]}]"
+    else:
+        body = f"[({source}) for {', '.join(arrays)} in _zip({', '.join(arrays)})]"
+    code = compile(f"lambda {params}: {body}", "<ecu-function>", "eval")
+    return eval(code, _KERNEL_GLOBALS)
+
+
+class ExpressionFunction:
+    """
+    A named ECU function defined by an arithmetic expression.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        expression: str,
+        inputs: Optional[List[str]] = None,
+        description: str = "",
+    ):
+        if not isinstance(name, str) or not name.isidentifier():
+            raise ValueError(f"Invalid function name: {name!r}")
+        self.name = name
+        self.source, self.inputs = parse_expression(expression, inputs)
+        self.expression = expression
+        self.description = description or f"ECU function: {self.source}"
+        # Compile the scalar kernel now so that compilation problems surface at registration
+        self._kernel((False,) * len(self.inputs))
+
+    def _kernel(self, array_mask: Tuple[bool, ...]) -> Callable[..., Any]:
+        try:
+            return compile_kernel(self.source, tuple(self.inputs), array_mask)
+        except (RecursionError, MemoryError, SyntaxError):
+            raise ValueError(f"Expression of function {self.name} is too complex to compile") from None
+
+    def evaluate(self, arguments: Dict[str, Any]) -> Any:
+        """
+        Evaluate the function on scalars or equally sized arrays.
+
+        Args:
+            arguments: Mapping from input name to a number or a list of numbers
+
+        Returns:
+            A float, or a list of floats when any input is an array
+        """
+        values = []
+        length = None
+        for name in self.inputs:
+            value = arguments.get(name)
+            if value is None:
+                raise ValueError(f"Missing input '{name}' for function {self.name}")
+            try:
+                if isinstance(value, (list, tuple)):
+                    if length is not None and len(value) != length:
+                        raise ValueError(f"Array inputs of function {self.name} differ in length")
+                    length = len(value)
+                    value = [float(item) for item in value]
+                else:
+                    value = float(value)
+            except TypeError:
+                raise ValueError(
+                    f"Input '{name}' of function {self.name} must be a number or a list of numbers"
+                ) from None
+            values.append(value)
+
+        array_mask = tuple(isinstance(value, list) for value in values)
+        kernel = self._kernel(array_mask)
+        try:
+            return kernel(*values)
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise ValueError(f"Evaluation of {self.name} failed: {e}") from None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the function definition as a dictionary."""
+        return {
+            "name": self.name,
+            "expression": self.source,
+            "inputs": self.inputs,
+            "description": self.description,
+        }
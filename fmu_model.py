@@ -5,6 +5,8 @@ This module implements a simple virtual ECU with addition functionality
 
 from typing import Dict, Any, Optional
 from datetime import datetime
+from scheduler import TaskScheduler
+from expressions import ExpressionFunction
 
 
 class VirtualECU:
@@ -32,6 +34,20 @@ class VirtualECU:
         ]
         self.status = "Active"
         
+        # Fixed-rate task rasters, each counting its own cycles, with the
+        # modeled execution times (ms) used by virtual-time runs
+        self.task_counters = {"task_1ms": 0, "task_10ms": 0, "task_100ms": 0}
+        self.scheduler = TaskScheduler()
+        self.scheduler.add_task("task_1ms", 1, lambda: self._tick("task_1ms"), 0.05)
+        self.scheduler.add_task("task_10ms", 10, lambda: self._tick("task_10ms"), 0.2)
+        self.scheduler.add_task("task_100ms", 100, lambda: self._tick("task_100ms"), 1.0)
+        
+        # User-defined functions registered at runtime
+        self.functions: Dict[str, ExpressionFunction] = {}
+        
+    def _tick(self, name: str) -> None:
+        self.task_counters[name] += 1
+    
     def add(self, a: float, b: float) -> float:
         """
         Perform addition operation.
@@ -46,6 +62,44 @@ class VirtualECU:
         result = a + b
         return result
     
+    def register_function(
+        self,
+        name: str,
+        expression: str,
+        inputs: Optional[list] = None,
+        description: str = ""
+    ) -> ExpressionFunction:
+        """
+        Register a user-defined function, replacing any with the same name.
+        
+        Args:
+            name: Function name
+            expression: Arithmetic expression over the inputs, e.g. "a * x + b"
+            inputs: Input names in call order (inferred from the expression if omitted)
+            description: Human readable description
+            
+        Returns:
+            The compiled function
+        """
+        function = ExpressionFunction(name, expression, inputs, description)
+        self.functions[name] = function
+        return function
+    
+    def evaluate_function(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        Evaluate a user-defined function on scalars or arrays.
+        
+        Args:
+            name: Function name
+            arguments: Mapping from input name to a number or a list of numbers
+            
+        Returns:
+            A float, or a list of floats when any input is an array
+        """
+        if name not in self.functions:
+            raise ValueError(f"Unknown function: {name}")
+        return self.functions[name].evaluate(arguments)
+    
     def get_info(self) -> Dict[str, Any]:
         """
         Get comprehensive information about the virtual ECU.
@@ -64,6 +118,10 @@ class VirtualECU:
             "status": self.status
         }
     
+    def get_model_identity(self) -> str:
+        """Get a string identifying the model and version that produces results."""
+        return f"{self.software_name}@{self.version}"
+    
     def get_version(self) -> str:
         """Get the software version."""
         return self.version
@@ -76,6 +134,28 @@ class VirtualECU:
         """Get the ECU level."""
         return self.ecu_level
     
+    def run_tasks(
+        self, duration_ms: float, mode: str = "realtime", reset_stats: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Run the periodic ECU tasks.
+        
+        Args:
+            duration_ms: Length of the run in milliseconds
+            mode: "realtime" (wall-clock pacing) or "virtual" (as fast as possible)
+            reset_stats: Clear previously recorded timing statistics first
+            
+        Returns:
+            Run summary including the task cycle counters
+        """
+        summary = self.scheduler.run(duration_ms, mode, reset_stats)
+        summary["task_counters"] = dict(self.task_counters)
+        return summary
+    
+    def get_task_timing(self, task: Optional[str] = None) -> Dict[str, Any]:
+        """Get jitter and overrun statistics of the periodic tasks."""
+        return self.scheduler.get_timing(task)
+    
     def get_status(self) -> Dict[str, str]:
         """Get the current status of the ECU."""
         return {
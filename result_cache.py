@@ -0,0 +1,301 @@
+"""
+Content-addressed result cache for deterministic ECU tool calls
+This module stores tool results on disk, keyed by model identity, tool name and arguments
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Rebuild the index from disk this often (seconds), to see other processes' entries
+DEFAULT_RESCAN_INTERVAL = 30.0
+
+# Allocation unit assumed when the file system does not report allocated blocks
+FALLBACK_BLOCK_SIZE = 4096
+
+# Temporary files older than this are left over from crashed writers
+STALE_TMP_SECONDS = 3600
+
+_ENTRY_SUFFIX = ".json"
+_TMP_SUFFIX = ".tmp"
+
+
+def _disk_usage(stat: os.stat_result) -> int:
+    # Small entries occupy whole blocks, so their byte size would understate the cache size
+    blocks = getattr(stat, "st_blocks", 0)
+    if blocks:
+        return blocks * 512
+    return -(-stat.st_size // FALLBACK_BLOCK_SIZE) * FALLBACK_BLOCK_SIZE
+
+
+def make_cache_key(model_identity: str, tool: str, arguments: Dict[str, Any]) -> str:
+    """
+    Build the cache key for a tool call.
+
+    Arguments are canonicalized (sorted keys, no whitespace) before hashing,
+    so the key does not depend on the order the client sent them in.
+
+    Args:
+        model_identity: Identity of the model producing the result (e.g. name and version)
+        tool: Tool name
+        arguments: Tool arguments
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    canonical = json.dumps(
+        {"model": model_identity, "tool": tool, "arguments": arguments},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        allow_nan=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Size-bounded on-disk cache of JSON tool results.
+
+    Entries live in <directory>/<first two hex digits>/<key>.json and are
+    evicted least recently used first once their disk usage exceeds max_bytes.
+    Recency survives restarts because hits refresh the file modification time.
+    Concurrent requests for the same key share a single computation, and
+    writes run in a worker thread so they never block the event loop.
+
+    Several server processes may share a directory. Each one keeps its own
+    in-memory index and rebuilds it from disk once rescan_interval seconds
+    have passed since the last scan, so their combined size can exceed
+    max_bytes only by what the others wrote since then.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        rescan_interval: float = DEFAULT_RESCAN_INTERVAL,
+    ):
+        if max_bytes <= 0:
+            raise ValueError(f"Cache size must be positive, got {max_bytes} bytes")
+        if rescan_interval < 0:
+            raise ValueError(f"Rescan interval must not be negative, got {rescan_interval} s")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        # The index is shared between the event loop and writer threads
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._last_scan = 0.0
+        self._scan_writes: Optional[Dict[str, int]] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + _ENTRY_SUFFIX)
+
+    def _scan(self) -> List[Tuple[int, str, int]]:
+        found = []
+        stale_before = time.time() - STALE_TMP_SECONDS
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                    if filename.endswith(_TMP_SUFFIX):
+                        if stat.st_mtime < stale_before:
+                            os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    # Evicted or renamed by another process meanwhile
+                    continue
+                if filename.endswith(_ENTRY_SUFFIX):
+                    found.append(
+                        (stat.st_mtime_ns, filename[:-len(_ENTRY_SUFFIX)], _disk_usage(stat))
+                    )
+        found.sort()
+        return found
+
+    def _load_index(self) -> None:
+        with self._lock:
+            if self._scan_writes is not None:
+                # Another thread is already rescanning
+                return
+            self._scan_writes = {}
+        try:
+            found = self._scan()
+        except BaseException:
+            with self._lock:
+                self._scan_writes = None
+            raise
+        with self._lock:
+            entries: "OrderedDict[str, int]" = OrderedDict(
+                (key, size) for _, key, size in found
+            )
+            # Entries written while the directory was being walked may have been missed
+            for key, size in self._scan_writes.items():
+                entries.pop(key, None)
+                entries[key] = size
+            self._entries = entries
+            self._total_bytes = sum(entries.values())
+            self._scan_writes = None
+            self._last_scan = time.monotonic()
+        self._evict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached result.
+
+        Args:
+            key: Key from make_cache_key()
+
+        Returns:
+            The cached result, or None if it is not cached
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Removed or corrupted behind our back
+            with self._lock:
+                self._forget(key)
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: Any) -> None:
+        """
+        Store a result, evicting old entries if the cache grows too large.
+
+        This does blocking file I/O and may rescan the directory; call it
+        from a worker thread when running on an event loop.
+
+        Args:
+            key: Key from make_cache_key()
+            result: JSON serializable result
+        """
+        data = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=_TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        size = _disk_usage(os.stat(path))
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            if self._scan_writes is not None:
+                self._scan_writes[key] = size
+            rescan_due = time.monotonic() - self._last_scan >= self.rescan_interval
+        if rescan_due:
+            self._load_index()
+        else:
+            self._evict()
+
+    def _forget(self, key: str) -> None:
+        # Caller holds self._lock
+        self._total_bytes -= self._entries.pop(key, 0)
+
+    def _evict(self) -> None:
+        victims = []
+        with self._lock:
+            while self._total_bytes > self.max_bytes and self._entries:
+                key = next(iter(self._entries))
+                self._forget(key)
+                victims.append(key)
+            self.evictions += len(victims)
+        for key in victims:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached result for a key, computing and storing it on a miss.
+
+        If the same key is already being computed, wait for that computation
+        instead of starting another one. The computation runs in its own task,
+        so cancelling any caller, including the one that started it, neither
+        cancels the other callers nor discards the result.
+
+        Args:
+            key: Key from make_cache_key()
+            compute: Coroutine function producing the result
+
+        Returns:
+            The (possibly cached) result
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        inflight = asyncio.ensure_future(self._compute_and_store(key, compute))
+        # Retrieve the outcome even if every caller was cancelled, so it is not reported as unhandled
+        inflight.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[key] = inflight
+        return await asyncio.shield(inflight)
+
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await compute()
+            try:
+                # Writes and periodic rescans do file I/O, so keep them off the event loop
+                await asyncio.to_thread(self.put, key, result)
+            except OSError:
+                # A failing cache must not fail the tool call
+                pass
+        finally:
+            del self._inflight[key]
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss statistics and the current cache size."""
+        lookups = self.hits + self.misses
+        return {
+            "directory": self.directory,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,226 @@
+"""
+Result encodings for MCP tool responses
+This module turns structured tool payloads into text, JSON or compact binary content
+"""
+
+import base64
+import json
+import math
+import struct
+from typing import Any, Dict, List, Optional
+
+import mcp.types as types
+
+FORMAT_TEXT = "text"
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+OUTPUT_FORMATS = [FORMAT_TEXT, FORMAT_JSON, FORMAT_BINARY]
+
+BINARY_MIME_TYPE = "application/msgpack"
+
+# Shared JSON schema fragment for the per-call output format option
+OUTPUT_FORMAT_SCHEMA = {
+    "type": "string",
+    "enum": OUTPUT_FORMATS,
+    "description": "Result encoding: human readable text, structured JSON, or compact MessagePack binary",
+}
+
+_pack_float = struct.Struct(">Bd").pack
+
+
+def resolve_output_format(requested: Optional[str], default: str) -> str:
+    """
+    Pick the output format for a call.
+
+    Args:
+        requested: Format requested by the call, if any
+        default: Session default used when the call does not request one
+
+    Returns:
+        One of OUTPUT_FORMATS
+    """
+    output_format = requested or default
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output format: {output_format} (expected one of {', '.join(OUTPUT_FORMATS)})"
+        )
+    return output_format
+
+
+def pack_msgpack(value: Any) -> bytes:
+    """
+    Encode a value as MessagePack.
+
+    Supports None, bool, int, float, str, bytes, lists/tuples and dicts,
+    which covers every payload produced by the ECU tools. Floats are always
+    written as float64 so numeric results round-trip exactly.
+
+    Args:
+        value: Value to encode
+
+    Returns:
+        MessagePack encoded bytes
+    """
+    out = bytearray()
+    _pack_into(out, value)
+    return bytes(out)
+
+
+def _pack_into(out: bytearray, value: Any) -> None:
+    if value is None:
+        out.append(0xC0)
+    elif value is True:
+        out.append(0xC3)
+    elif value is False:
+        out.append(0xC2)
+    elif isinstance(value, float):
+        out += _pack_float(0xCB, value)
+    elif isinstance(value, int):
+        _pack_int(out, value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        length = len(data)
+        if length < 32:
+            out.append(0xA0 | length)
+        elif length < 0x100:
+            out += struct.pack(">BB", 0xD9, length)
+        elif length < 0x10000:
+            out += struct.pack(">BH", 0xDA, length)
+        else:
+            out += struct.pack(">BI", 0xDB, length)
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        length = len(value)
+        if length < 0x100:
+            out += struct.pack(">BB", 0xC4, length)
+        elif length < 0x10000:
+            out += struct.pack(">BH", 0xC5, length)
+        else:
+            out += struct.pack(">BI", 0xC6, length)
+        out += value
+    elif isinstance(value, (list, tuple)):
+        length = len(value)
+        if length < 16:
+            out.append(0x90 | length)
+        elif length < 0x10000:
+            out += struct.pack(">BH", 0xDC, length)
+        else:
+            out += struct.pack(">BI", 0xDD, length)
+        if length and all(type(item) is float for item in value):
+            # Homogeneous float arrays are packed in a single call
+            out += struct.pack(">" + "Bd" * length, *_interleave_float_tags(value))
+        else:
+            for item in value:
+                _pack_into(out, item)
+    elif isinstance(value, dict):
+        length = len(value)
+        if length < 16:
+            out.append(0x80 | length)
+        elif length < 0x10000:
+            out += struct.pack(">BH", 0xDE, length)
+        else:
+            out += struct.pack(">BI", 0xDF, length)
+        for key, item in value.items():
+            _pack_into(out, key)
+            _pack_into(out, item)
+    else:
+        raise TypeError(f"Cannot encode value of type {type(value).__name__} as MessagePack")
+
+
+def _interleave_float_tags(values: List[float]) -> List[Any]:
+    tagged: List[Any] = [0xCB, 0.0] * len(values)
+    tagged[1::2] = values
+    return tagged
+
+
+def _pack_int(out: bytearray, value: int) -> None:
+    if 0 <= value < 0x80:
+        out.append(value)
+    elif -32 <= value < 0:
+        out.append(value & 0xFF)
+    elif 0 <= value < 0x100:
+        out += struct.pack(">BB", 0xCC, value)
+    elif 0 <= value < 0x10000:
+        out += struct.pack(">BH", 0xCD, value)
+    elif 0 <= value < 0x100000000:
+        out += struct.pack(">BI", 0xCE, value)
+    elif 0 <= value < 0x10000000000000000:
+        out += struct.pack(">BQ", 0xCF, value)
+    elif -0x80 <= value < 0:
+        out += struct.pack(">Bb", 0xD0, value)
+    elif -0x8000 <= value < 0:
+        out += struct.pack(">Bh", 0xD1, value)
+    elif -0x80000000 <= value < 0:
+        out += struct.pack(">Bi", 0xD2, value)
+    elif -0x8000000000000000 <= value < 0:
+        out += struct.pack(">Bq", 0xD3, value)
+    else:
+        raise OverflowError(f"Integer {value} does not fit in 64 bits")
+
+
+def dumps_json(value: Any) -> str:
+    """
+    Serialize a value as strict JSON.
+
+    Non-finite floats have no JSON representation; they are written as the
+    strings "inf", "-inf" and "nan" instead of the invalid Infinity/NaN tokens.
+
+    Args:
+        value: Value to serialize
+
+    Returns:
+        Compact JSON text
+    """
+    try:
+        return json.dumps(value, separators=(",", ":"), allow_nan=False)
+    except ValueError:
+        # Only payloads that actually contain non-finite floats pay for the rewrite
+        return json.dumps(_replace_non_finite(value), separators=(",", ":"), allow_nan=False)
+
+
+def _replace_non_finite(value: Any) -> Any:
+    if isinstance(value, float) and not math.isfinite(value):
+        return "nan" if math.isnan(value) else ("inf" if value > 0 else "-inf")
+    if isinstance(value, dict):
+        return {key: _replace_non_finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_replace_non_finite(item) for item in value]
+    return value
+
+
+def encode_result(
+    name: str, payload: Dict[str, Any], output_format: str
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """
+    Encode a structured tool payload as MCP content.
+
+    Args:
+        name: Tool name, used for the resource URI of binary results
+        payload: Structured result produced by the tool
+        output_format: FORMAT_JSON or FORMAT_BINARY
+
+    Returns:
+        List with a single MCP content item
+    """
+    if output_format == FORMAT_JSON:
+        return [
+            types.TextContent(
+                type="text",
+                text=dumps_json(payload)
+            )
+        ]
+
+    if output_format == FORMAT_BINARY:
+        return [
+            types.EmbeddedResource(
+                type="resource",
+                resource=types.BlobResourceContents(
+                    uri=f"ecu://results/{name}",
+                    mimeType=BINARY_MIME_TYPE,
+                    blob=base64.b64encode(pack_msgpack(payload)).decode("ascii"),
+                ),
+            )
+        ]
+
+    raise ValueError(f"Output format {output_format} has no structured encoding")
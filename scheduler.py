@@ -0,0 +1,313 @@
+"""
+Periodic task scheduler for the Virtual ECU
+This module runs ECU tasks at fixed rates and records their timing behaviour
+"""
+
+import heapq
+import math
+import threading
+import time
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Optional
+
+MODE_REALTIME = "realtime"
+MODE_VIRTUAL = "virtual"
+
+SCHEDULER_MODES = [MODE_REALTIME, MODE_VIRTUAL]
+
+# Longest accepted run; a run cannot be cancelled once started
+MAX_DURATION_MS = 60_000
+
+# Upper edges (microseconds) of the jitter histogram buckets; the last bucket is open
+JITTER_BUCKET_EDGES_US = [10, 50, 100, 500, 1000, 5000]
+
+# Remaining wait below which the scheduler busy-waits instead of sleeping,
+# since time.sleep() typically overshoots by tens of microseconds
+SPIN_THRESHOLD_NS = 200_000
+
+
+def _bucket_labels() -> List[str]:
+    labels = []
+    lower = 0
+    for edge in JITTER_BUCKET_EDGES_US:
+        labels.append(f"{lower}-{edge}us")
+        lower = edge
+    labels.append(f">={lower}us")
+    return labels
+
+
+JITTER_BUCKET_LABELS = _bucket_labels()
+
+
+class TaskStats:
+    """
+    Timing statistics for a single periodic task.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all recorded activations."""
+        self.activations = 0
+        self.overruns = 0
+        self.late_starts = 0
+        self.skipped = 0
+        self.jitter_min_ns = 0
+        self.jitter_max_ns = 0
+        self.jitter_total_ns = 0
+        self.exec_max_ns = 0
+        self.exec_total_ns = 0
+        self.host_exec_max_ns = 0
+        self.host_exec_total_ns = 0
+        self.histogram = [0] * len(JITTER_BUCKET_LABELS)
+
+    def record(
+        self, jitter_ns: int, exec_ns: int, host_exec_ns: int, overrun: bool, late_start: bool
+    ) -> None:
+        """
+        Record one activation.
+
+        Args:
+            jitter_ns: Delay between the release time and the actual start
+            exec_ns: Execution time on the scheduler's clock (modeled in virtual mode)
+            host_exec_ns: Execution time of the task body measured on the host
+            overrun: Whether the execution time alone exceeded the period
+            late_start: Whether the task missed its next release only because it started late
+        """
+        if self.activations == 0 or jitter_ns < self.jitter_min_ns:
+            self.jitter_min_ns = jitter_ns
+        if jitter_ns > self.jitter_max_ns:
+            self.jitter_max_ns = jitter_ns
+        if exec_ns > self.exec_max_ns:
+            self.exec_max_ns = exec_ns
+        if host_exec_ns > self.host_exec_max_ns:
+            self.host_exec_max_ns = host_exec_ns
+        self.activations += 1
+        self.jitter_total_ns += jitter_ns
+        self.exec_total_ns += exec_ns
+        self.host_exec_total_ns += host_exec_ns
+        self.histogram[bisect_right(JITTER_BUCKET_EDGES_US, jitter_ns // 1000)] += 1
+        if overrun:
+            self.overruns += 1
+        if late_start:
+            self.late_starts += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the statistics as a dictionary (times in microseconds)."""
+        count = self.activations or 1
+        return {
+            "activations": self.activations,
+            "overruns": self.overruns,
+            "late_starts": self.late_starts,
+            "skipped": self.skipped,
+            "jitter_min_us": self.jitter_min_ns / 1000,
+            "jitter_max_us": self.jitter_max_ns / 1000,
+            "jitter_mean_us": self.jitter_total_ns / count / 1000,
+            "exec_max_us": self.exec_max_ns / 1000,
+            "exec_mean_us": self.exec_total_ns / count / 1000,
+            "host_exec_max_us": self.host_exec_max_ns / 1000,
+            "host_exec_mean_us": self.host_exec_total_ns / count / 1000,
+            "jitter_histogram": dict(zip(JITTER_BUCKET_LABELS, self.histogram)),
+        }
+
+
+class PeriodicTask:
+    """
+    A task released at a fixed period.
+
+    exec_time_ms is the task's modeled execution time, by which virtual
+    runs advance the clock so that they are reproducible.
+    """
+
+    def __init__(
+        self, name: str, period_ms: float, callback: Callable[[], Any], exec_time_ms: float = 0.0
+    ):
+        if period_ms <= 0:
+            raise ValueError(f"Task period must be positive, got {period_ms} ms")
+        if not (0 <= exec_time_ms < math.inf):
+            raise ValueError(f"Task execution time must be non-negative, got {exec_time_ms} ms")
+        self.name = name
+        self.period_ms = period_ms
+        self.period_ns = int(period_ms * 1_000_000)
+        self.exec_time_ms = exec_time_ms
+        self.exec_time_ns = int(exec_time_ms * 1_000_000)
+        self.callback = callback
+        self.stats = TaskStats()
+
+
+class TaskScheduler:
+    """
+    Deterministic fixed-rate scheduler for ECU tasks.
+
+    Release times are computed as start + k * period, so they never drift
+    no matter how late individual activations start. When several tasks are
+    released at the same instant, the one with the shorter period runs first
+    (rate-monotonic order). A task that finishes after its next release
+    misses its deadline and any releases it missed are skipped. The miss is
+    counted as an overrun when the execution time alone exceeded the period,
+    and as a late start otherwise.
+
+    Two pacing modes are supported:
+        realtime: wait on the monotonic clock until each release time
+        virtual: advance a virtual clock by each task's modeled execution
+            time, jumping over idle time so the run completes as fast as
+            possible; the timing statistics are then fully deterministic and
+            the measured host execution time is reported separately
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], int] = time.monotonic_ns,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.clock = clock
+        self.sleep = sleep
+        self.tasks: Dict[str, PeriodicTask] = {}
+        self._run_lock = threading.Lock()
+
+    def add_task(
+        self, name: str, period_ms: float, callback: Callable[[], Any], exec_time_ms: float = 0.0
+    ) -> PeriodicTask:
+        """
+        Register a periodic task.
+
+        Args:
+            name: Unique task name
+            period_ms: Release period in milliseconds
+            callback: Task body, called once per activation
+            exec_time_ms: Modeled execution time used by virtual runs
+
+        Returns:
+            The registered task
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task already registered: {name}")
+        task = PeriodicTask(name, period_ms, callback, exec_time_ms)
+        self.tasks[name] = task
+        return task
+
+    def reset_stats(self) -> None:
+        """Clear the timing statistics of all tasks."""
+        for task in self.tasks.values():
+            task.stats.reset()
+
+    def run(
+        self, duration_ms: float, mode: str = MODE_REALTIME, reset_stats: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Run all tasks for a given duration.
+
+        Only one run may be active at a time, so statistics from concurrent
+        runs are never mixed; a second run is rejected while one is active.
+
+        Args:
+            duration_ms: Length of the run in (wall-clock or virtual) milliseconds
+            mode: MODE_REALTIME or MODE_VIRTUAL
+            reset_stats: Clear previously recorded statistics before the run
+
+        Returns:
+            Summary of the run
+        """
+        if mode not in SCHEDULER_MODES:
+            raise ValueError(
+                f"Unknown scheduler mode: {mode} (expected one of {', '.join(SCHEDULER_MODES)})"
+            )
+        if not (0 < duration_ms <= MAX_DURATION_MS) or not math.isfinite(duration_ms):
+            raise ValueError(
+                f"Duration must be between 0 and {MAX_DURATION_MS} ms, got {duration_ms} ms"
+            )
+        if not self._run_lock.acquire(blocking=False):
+            raise ValueError("A scheduler run is already in progress")
+        try:
+            if reset_stats:
+                self.reset_stats()
+            return self._run(duration_ms, mode)
+        finally:
+            self._run_lock.release()
+
+    def _run(self, duration_ms: float, mode: str) -> Dict[str, Any]:
+        realtime = mode == MODE_REALTIME
+        clock = self.clock
+        duration_ns = int(duration_ms * 1_000_000)
+
+        # (release_ns, period_ns, registration order, task) keeps ties rate-monotonic
+        queue = [
+            (0, task.period_ns, order, task)
+            for order, task in enumerate(self.tasks.values())
+        ]
+        heapq.heapify(queue)
+
+        activations = 0
+        virtual_now = 0
+        wall_start = time.monotonic_ns()
+        start = clock() if realtime else 0
+        end = start + duration_ns
+
+        while queue and queue[0][0] + start < end:
+            offset, period_ns, order, task = queue[0]
+            release = start + offset
+
+            if realtime:
+                remaining = release - clock()
+                if remaining > SPIN_THRESHOLD_NS:
+                    self.sleep((remaining - SPIN_THRESHOLD_NS) / 1e9)
+                while clock() < release:
+                    pass
+                began = clock()
+                task.callback()
+                finished = clock()
+                exec_ns = host_exec_ns = finished - began
+            else:
+                # Tasks released together run one after another, so later ones start late
+                began = max(release, virtual_now)
+                exec_start = time.perf_counter_ns()
+                task.callback()
+                host_exec_ns = time.perf_counter_ns() - exec_start
+                exec_ns = task.exec_time_ns
+                finished = began + exec_ns
+                virtual_now = finished
+
+            next_offset = offset + period_ns
+            deadline_missed = finished > start + next_offset
+            overrun = exec_ns > period_ns
+            if deadline_missed:
+                # Skip the releases the task missed instead of running them back to back
+                missed = (finished - start - next_offset) // period_ns + 1
+                task.stats.skipped += missed
+                next_offset += missed * period_ns
+
+            task.stats.record(
+                began - release, exec_ns, host_exec_ns, overrun, deadline_missed and not overrun
+            )
+            activations += 1
+            heapq.heapreplace(queue, (next_offset, period_ns, order, task))
+
+        return {
+            "mode": mode,
+            "duration_ms": duration_ms,
+            "activations": activations,
+            "elapsed_ms": (time.monotonic_ns() - wall_start) / 1_000_000,
+        }
+
+    def get_timing(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get timing statistics for one task or all tasks.
+
+        Args:
+            name: Task name, or None for all tasks
+
+        Returns:
+            Dictionary mapping task name to its period and statistics
+        """
+        if name is not None and name not in self.tasks:
+            raise ValueError(f"Unknown task: {name}")
+        tasks = [self.tasks[name]] if name is not None else self.tasks.values()
+        return {
+            task.name: {
+                "period_ms": task.period_ms,
+                "exec_time_ms": task.exec_time_ms,
+                **task.stats.to_dict(),
+            }
+            for task in tasks
+        }
@@ -5,16 +5,48 @@ This server exposes the Virtual ECU functionality as MCP tools
 
 import asyncio
 import os
+import sys
 from typing import Any
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
 import mcp.types as types
 from fmu_model import VirtualECU
+from expressions import ExpressionFunction
+from scheduler import MAX_DURATION_MS, MODE_REALTIME, SCHEDULER_MODES
+from result_cache import DEFAULT_MAX_BYTES, ResultCache, make_cache_key
+from result_format import (
+    FORMAT_TEXT,
+    OUTPUT_FORMAT_SCHEMA,
+    encode_result,
+    resolve_output_format,
+)
 
 # Initialize the Virtual ECU
 ecu = VirtualECU()
 
+# Default output format for this (stdio, single client) session.
+# Individual calls can override it with an "output_format" argument.
+try:
+    session_output_format = resolve_output_format(
+        os.getenv("FMU_OUTPUT_FORMAT", FORMAT_TEXT).strip().lower(), FORMAT_TEXT
+    )
+except ValueError as e:
+    # stdout carries the MCP protocol, so warn on stderr
+    print(f"Warning: FMU_OUTPUT_FORMAT ignored, using text: {e}", file=sys.stderr)
+    session_output_format = FORMAT_TEXT
+
+# On-disk cache of deterministic results, enabled by setting FMU_CACHE_DIR
+result_cache = None
+if os.getenv("FMU_CACHE_DIR"):
+    try:
+        result_cache = ResultCache(
+            os.environ["FMU_CACHE_DIR"],
+            int(os.getenv("FMU_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        )
+    except (ValueError, OSError) as e:
+        print(f"Warning: result cache disabled: {e}", file=sys.stderr)
+
 # Create MCP server
 server = Server("fmu-virtual-ecu")
 
@@ -30,7 +62,7 @@ async def handle_list_tools() -> list[types.Tool]:
             description="Get comprehensive information about the Virtual ECU including software version, interfaces, ECU level, and capabilities",
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {"output_format": OUTPUT_FORMAT_SCHEMA},
                 "required": []
             },
         ),
@@ -39,7 +71,7 @@ async def handle_list_tools() -> list[types.Tool]:
             description="Get the software version of the Virtual ECU",
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {"output_format": OUTPUT_FORMAT_SCHEMA},
                 "required": []
             },
         ),
@@ -48,7 +80,7 @@ async def handle_list_tools() -> list[types.Tool]:
             description="Get the list of supported communication interfaces (CAN, LIN, Ethernet, FlexRay)",
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {"output_format": OUTPUT_FORMAT_SCHEMA},
                 "required": []
             },
         ),
@@ -57,7 +89,7 @@ async def handle_list_tools() -> list[types.Tool]:
             description="Get the ECU level (e.g., Level_1, Level_2, etc.)",
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {"output_format": OUTPUT_FORMAT_SCHEMA},
                 "required": []
             },
         ),
@@ -75,6 +107,7 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "number",
                         "description": "Second number to add",
                     },
+                    "output_format": OUTPUT_FORMAT_SCHEMA,
                 },
                 "required": ["a", "b"],
             },
@@ -84,26 +117,128 @@ async def handle_list_tools() -> list[types.Tool]:
             description="Get the current operational status of the Virtual ECU",
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {"output_format": OUTPUT_FORMAT_SCHEMA},
+                "required": []
+            },
+        ),
+        types.Tool(
+            name="run_ecu_tasks",
+            description="Run the periodic ECU tasks (1 ms, 10 ms and 100 ms rasters) for a given duration, either paced by the wall clock or in as-fast-as-possible virtual time",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "duration_ms": {
+                        "type": "number",
+                        "description": f"Length of the run in milliseconds (at most {MAX_DURATION_MS})",
+                        "exclusiveMinimum": 0,
+                        "maximum": MAX_DURATION_MS,
+                    },
+                    "mode": {
+                        "type": "string",
+                        "enum": SCHEDULER_MODES,
+                        "description": "realtime (wall-clock pacing) or virtual (as fast as possible)",
+                    },
+                    "reset_stats": {
+                        "type": "boolean",
+                        "description": "Clear previously recorded timing statistics before the run",
+                    },
+                    "output_format": OUTPUT_FORMAT_SCHEMA,
+                },
+                "required": ["duration_ms"],
+            },
+        ),
+        types.Tool(
+            name="get_task_timing",
+            description="Get jitter histograms, execution times and overrun counts of the periodic ECU tasks",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "task": {
+                        "type": "string",
+                        "description": "Task name (e.g. task_10ms); omit for all tasks",
+                    },
+                    "output_format": OUTPUT_FORMAT_SCHEMA,
+                },
+                "required": []
+            },
+        ),
+        types.Tool(
+            name="set_output_format",
+            description="Set the default result encoding for this session: text (human readable), json (structured) or binary (compact MessagePack)",
+            inputSchema={
+                "type": "object",
+                "properties": {"format": OUTPUT_FORMAT_SCHEMA},
+                "required": ["format"]
+            },
+        ),
+        types.Tool(
+            name="get_cache_stats",
+            description="Get hit/miss statistics and size of the on-disk result cache for deterministic ECU computations",
+            inputSchema={
+                "type": "object",
+                "properties": {"output_format": OUTPUT_FORMAT_SCHEMA},
                 "required": []
             },
         ),
-    ]
+        types.Tool(
+            name="register_ecu_function",
+            description="Register a new ECU function from an arithmetic expression (e.g. 'a * x + b'). The function becomes available as its own tool and accepts numbers or arrays of numbers for each input.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "Function and tool name (a valid identifier)",
+                    },
+                    "expression": {
+                        "type": "string",
+                        "description": "Arithmetic expression using + - * / // % **, abs, min, max, sqrt, exp, log, log10, sin, cos, tan, atan2, hypot, floor, ceil, pi and e",
+                    },
+                    "inputs": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Input names in call order; inferred from the expression if omitted",
+                    },
+                    "description": {
+                        "type": "string",
+                        "description": "Description of the function",
+                    },
+                    "output_format": OUTPUT_FORMAT_SCHEMA,
+                },
+                "required": ["name", "expression"],
+            },
+        ),
+    ] + [function_tool(function) for function in ecu.functions.values()]
 
 
-@server.call_tool()
-async def handle_call_tool(
-    name: str, arguments: dict[str, Any] | None
-) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+def function_tool(function: ExpressionFunction) -> types.Tool:
     """
-    Handle tool calls for the Virtual ECU.
+    Build the MCP tool for a user-defined ECU function.
     """
-    if name == "get_ecu_info":
-        info = ecu.get_info()
-        return [
-            types.TextContent(
-                type="text",
-                text=f"""Virtual ECU Information:
+    properties: dict[str, Any] = {
+        name: {
+            "oneOf": [
+                {"type": "number"},
+                {"type": "array", "items": {"type": "number"}},
+            ],
+            "description": f"Input '{name}' as a number or an array of numbers",
+        }
+        for name in function.inputs
+    }
+    properties["output_format"] = OUTPUT_FORMAT_SCHEMA
+    return types.Tool(
+        name=function.name,
+        description=function.description,
+        inputSchema={
+            "type": "object",
+            "properties": properties,
+            "required": list(function.inputs),
+        },
+    )
+
+
+def _text_ecu_info(info: dict[str, Any]) -> str:
+    return f"""Virtual ECU Information:
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 Software: {info['software']}
 Version: {info['version']}
@@ -119,36 +254,102 @@ Capabilities:
 
 Status: {info['status']}
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"""
-            )
-        ]
+
+
+def _text_task_timing(timing: dict[str, Any]) -> str:
+    lines = ["Task Timing:", "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"]
+    for task, stats in timing.items():
+        lines.append(
+            f"{task} ({stats['period_ms']} ms): {stats['activations']} activations, "
+            f"{stats['overruns']} overruns, {stats['late_starts']} late starts, "
+            f"{stats['skipped']} skipped"
+        )
+        lines.append(
+            f"  Jitter: min {stats['jitter_min_us']:.1f} us, mean {stats['jitter_mean_us']:.1f} us, "
+            f"max {stats['jitter_max_us']:.1f} us"
+        )
+        lines.append(
+            f"  Execution: mean {stats['exec_mean_us']:.1f} us, max {stats['exec_max_us']:.1f} us "
+            f"(host: mean {stats['host_exec_mean_us']:.1f} us, max {stats['host_exec_max_us']:.1f} us)"
+        )
+        lines.extend(
+            f"  • {bucket}: {count}" for bucket, count in stats['jitter_histogram'].items()
+        )
+    lines.append("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    return "\n".join(lines)
+
+
+def _text_cache_stats(stats: dict[str, Any]) -> str:
+    if not stats['enabled']:
+        return "Result Cache: disabled (set FMU_CACHE_DIR to enable)"
+    return f"""Result Cache: {stats['directory']}
+  • Hits: {stats['hits']}
+  • Misses: {stats['misses']}
+  • Coalesced: {stats['coalesced']}
+  • Hit Rate: {stats['hit_rate']:.1%}
+  • Evictions: {stats['evictions']}
+  • Entries: {stats['entries']}
+  • Size: {stats['bytes']} / {stats['max_bytes']} bytes"""
+
+
+# Human readable renderers, only used for the text output format
+TEXT_RENDERERS = {
+    "get_ecu_info": _text_ecu_info,
+    "get_software_version": lambda p: f"Virtual ECU Software Version: {p['version']}",
+    "get_interfaces": lambda p: "Supported Communication Interfaces:\n" +
+        "\n".join(f"  • {interface}" for interface in p['interfaces']),
+    "get_ecu_level": lambda p: f"Virtual ECU Level: {p['ecu_level']}",
+    "perform_addition": lambda p: f"Addition Result: {p['a']} + {p['b']} = {p['result']}",
+    "get_ecu_status": lambda p: f"ECU Status: {p['status']}\nTimestamp: {p['timestamp']}",
+    "run_ecu_tasks": lambda p: f"ECU Tasks Run ({p['mode']}): {p['activations']} activations "
+        f"in {p['duration_ms']} ms (elapsed {p['elapsed_ms']:.1f} ms)\n" +
+        "\n".join(f"  • {task}: {count} cycles" for task, count in p['task_counters'].items()),
+    "get_task_timing": _text_task_timing,
+    "set_output_format": lambda p: f"Output format set to: {p['output_format']}",
+    "get_cache_stats": _text_cache_stats,
+    "register_ecu_function": lambda p: f"Registered ECU function: {p['name']}({', '.join(p['inputs'])}) = {p['expression']}",
+}
+
+
+def _text_function_result(payload: dict[str, Any]) -> str:
+    return f"{payload['function']} Result: {payload['result']}"
+
+
+# Tools that may block for a long time and are run in a worker thread
+BLOCKING_TOOLS = {"run_ecu_tasks"}
+
+# Deterministic tools whose results are cached (user-defined functions are too)
+CACHEABLE_TOOLS = {"perform_addition"}
+
+
+def cache_model_identity(name: str) -> str:
+    """
+    Identify the model behind a cacheable tool, including the definition of user-defined functions.
+    """
+    identity = ecu.get_model_identity()
+    if name in ecu.functions:
+        function = ecu.functions[name]
+        identity += f"/{function.source}({','.join(function.inputs)})"
+    return identity
+
+
+def call_ecu_tool(name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+    """
+    Run a Virtual ECU tool and return its structured result.
+    """
+    global session_output_format
+
+    if name == "get_ecu_info":
+        return ecu.get_info()
     
     elif name == "get_software_version":
-        version = ecu.get_version()
-        return [
-            types.TextContent(
-                type="text",
-                text=f"Virtual ECU Software Version: {version}"
-            )
-        ]
+        return {"version": ecu.get_version()}
     
     elif name == "get_interfaces":
-        interfaces = ecu.get_interfaces()
-        return [
-            types.TextContent(
-                type="text",
-                text=f"Supported Communication Interfaces:\n" + 
-                     "\n".join(f"  • {interface}" for interface in interfaces)
-            )
-        ]
+        return {"interfaces": ecu.get_interfaces()}
     
     elif name == "get_ecu_level":
-        level = ecu.get_ecu_level()
-        return [
-            types.TextContent(
-                type="text",
-                text=f"Virtual ECU Level: {level}"
-            )
-        ]
+        return {"ecu_level": ecu.get_ecu_level()}
     
     elif name == "perform_addition":
         if not arguments:
@@ -161,24 +362,115 @@ Status: {info['status']}
             raise ValueError("Both 'a' and 'b' parameters are required")
         
         result = ecu.add(float(a), float(b))
-        return [
-            types.TextContent(
-                type="text",
-                text=f"Addition Result: {a} + {b} = {result}"
-            )
-        ]
+        return {"a": a, "b": b, "result": result}
     
     elif name == "get_ecu_status":
-        status = ecu.get_status()
+        return ecu.get_status()
+    
+    elif name == "run_ecu_tasks":
+        duration_ms = arguments.get("duration_ms")
+        if duration_ms is None:
+            raise ValueError("The 'duration_ms' parameter is required")
+        if isinstance(duration_ms, bool) or not isinstance(duration_ms, (int, float)):
+            raise ValueError("The 'duration_ms' parameter must be a number")
+        mode = arguments.get("mode", MODE_REALTIME)
+        if not isinstance(mode, str):
+            raise ValueError("The 'mode' parameter must be a string")
+        reset_stats = arguments.get("reset_stats", False)
+        if not isinstance(reset_stats, bool):
+            raise ValueError("The 'reset_stats' parameter must be a boolean")
+        return ecu.run_tasks(float(duration_ms), mode, reset_stats)
+    
+    elif name == "get_task_timing":
+        task = arguments.get("task")
+        if task is not None and not isinstance(task, str):
+            raise ValueError("The 'task' parameter must be a string")
+        return ecu.get_task_timing(task)
+    
+    elif name == "set_output_format":
+        if not arguments.get("format"):
+            raise ValueError("The 'format' parameter is required")
+        session_output_format = resolve_output_format(
+            arguments["format"], session_output_format
+        )
+        return {"output_format": session_output_format}
+    
+    elif name == "get_cache_stats":
+        if result_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **result_cache.get_stats()}
+    
+    elif name == "register_ecu_function":
+        function_name = arguments.get("name")
+        if function_name in TEXT_RENDERERS:
+            raise ValueError(f"Cannot replace built-in tool: {function_name}")
+        function = ecu.register_function(
+            function_name,
+            arguments.get("expression"),
+            arguments.get("inputs"),
+            arguments.get("description", ""),
+        )
+        return function.to_dict()
+    
+    elif name in ecu.functions:
+        return {"function": name, "result": ecu.evaluate_function(name, arguments)}
+    
+    else:
+        raise ValueError(f"Unknown tool: {name}")
+
+
+async def notify_tool_list_changed() -> None:
+    """
+    Tell the connected client that the tool list changed, if called within a request.
+    """
+    try:
+        session = server.request_context.session
+    except LookupError:
+        return
+    await session.send_tool_list_changed()
+
+
+@server.call_tool()
+async def handle_call_tool(
+    name: str, arguments: dict[str, Any] | None
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """
+    Handle tool calls for the Virtual ECU.
+    """
+    arguments = dict(arguments or {})
+    output_format = resolve_output_format(
+        arguments.pop("output_format", None), session_output_format
+    )
+    key = None
+    if result_cache is not None and (name in CACHEABLE_TOOLS or name in ecu.functions):
+        try:
+            key = make_cache_key(cache_model_identity(name), name, arguments)
+        except ValueError:
+            # NaN and Infinity have no canonical JSON form, so such calls bypass the cache
+            key = None
+    if key is not None:
+        # Misses run in a worker thread so identical concurrent calls share one computation
+        payload = await result_cache.get_or_compute(
+            key, lambda: asyncio.to_thread(call_ecu_tool, name, arguments)
+        )
+    elif name in BLOCKING_TOOLS or name in ecu.functions:
+        # Keep the event loop responsive while tasks are paced or large arrays evaluated
+        payload = await asyncio.to_thread(call_ecu_tool, name, arguments)
+    else:
+        payload = call_ecu_tool(name, arguments)
+
+    if name == "register_ecu_function":
+        await notify_tool_list_changed()
+
+    if output_format == FORMAT_TEXT:
+        render = TEXT_RENDERERS.get(name, _text_function_result)
         return [
             types.TextContent(
                 type="text",
-                text=f"ECU Status: {status['status']}\nTimestamp: {status['timestamp']}"
+                text=render(payload)
             )
         ]
-    
-    else:
-        raise ValueError(f"Unknown tool: {name}")
+    return encode_result(name, payload, output_format)
 
 
 async def main():
@@ -193,7 +485,7 @@ async def main():
                 server_name="fmu-virtual-ecu",
                 server_version="1.0.0",
                 capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
+                    notification_options=NotificationOptions(tools_changed=True),
                     experimental_capabilities={},
                 ),
             ),
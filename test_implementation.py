@@ -48,7 +48,82 @@ try:
     status = ecu.get_status()
     assert status['status'] == 'Active', "Status retrieval failed"
     print("✅ get_status() works correctly")
-    
+
+    # Test periodic tasks in virtual time
+    summary = ecu.run_tasks(100, "virtual")
+    assert summary['task_counters'] == {"task_1ms": 100, "task_10ms": 10, "task_100ms": 1}, \
+        f"Task counters mismatch: {summary['task_counters']}"
+    timing = ecu.get_task_timing()
+    assert timing['task_10ms']['activations'] == 10, "Task activations mismatch"
+    assert timing['task_1ms']['jitter_min_us'] == 0, "Highest rate task should start on time"
+    # Released together with task_1ms (50 us) and task_10ms (200 us) at t=0
+    assert timing['task_100ms']['jitter_max_us'] == 250, \
+        f"Modeled jitter mismatch: {timing['task_100ms']['jitter_max_us']} us"
+    other = VirtualECU()
+    other.run_tasks(100, "virtual")
+    strip_host = lambda t: {k: v for k, v in t.items() if not k.startswith("host_")}
+    assert all(
+        strip_host(stats) == strip_host(other.get_task_timing()[task])
+        for task, stats in timing.items()
+    ), "Virtual runs are not deterministic"
+    print("✅ run_tasks() and get_task_timing() work correctly")
+
+    # Test overrun detection
+    from scheduler import TaskScheduler
+    import time
+    scheduler = TaskScheduler()
+    scheduler.add_task("slow", 1, lambda: None, exec_time_ms=2.5)
+    scheduler.run(10, "virtual")
+    stats = scheduler.get_timing("slow")['slow']
+    assert stats['overruns'] == stats['activations'] > 0, "Overruns not detected"
+    assert stats['late_starts'] == 0, "Overruns counted as late starts"
+    assert stats['skipped'] >= 2 * stats['activations'], "Missed releases not skipped"
+    print("✅ TaskScheduler overrun detection works correctly")
+
+    # Test user-defined functions
+    ecu.register_function("scale", "gain * x + offset")
+    assert ecu.functions['scale'].inputs == ["gain", "x", "offset"], "Input inference failed"
+    result = ecu.evaluate_function("scale", {"gain": 2, "x": 3, "offset": 1})
+    assert result == 7.0, f"Scalar evaluation failed: expected 7.0, got {result}"
+    result = ecu.evaluate_function("scale", {"gain": 2, "x": [1, 2, 3], "offset": [0, 1, 2]})
+    assert result == [2.0, 5.0, 8.0], f"Array evaluation failed: got {result}"
+    for unsafe in ["__import__('os')", "x.real", "open(x)", "[x]", "x if x else 1"]:
+        try:
+            ecu.register_function("unsafe", unsafe)
+            raise AssertionError(f"Unsafe expression accepted: {unsafe}")
+        except ValueError:
+            pass
+    ecu.register_function("boom", "floor(x) ** floor(y)")
+    start = time.monotonic()
+    try:
+        ecu.evaluate_function("boom", {"x": 10, "y": 3e7})
+        raise AssertionError("Overflow not reported")
+    except ValueError:
+        pass
+    assert time.monotonic() - start < 1, "floor() allowed unbounded integer arithmetic"
+    assert ecu.evaluate_function("boom", {"x": 2.5, "y": 3.7}) == 8.0, "floor() result mismatch"
+    for expression, inputs in [("2 * output_format", None), ("x * y", "xy")]:
+        try:
+            ecu.register_function("invalid", expression, inputs)
+            raise AssertionError(f"Invalid inputs accepted: {expression!r}, {inputs!r}")
+        except ValueError:
+            pass
+    for deep in ["+".join(["x"] * 250), "-" * 900 + "x"]:
+        try:
+            ecu.register_function("deep", deep)
+            raise AssertionError(f"Deeply nested expression accepted: {deep[:20]}...")
+        except ValueError:
+            pass
+    assert ecu.register_function("wide", "+".join(["x"] * 50)).evaluate({"x": 1}) == 50.0, \
+        "Moderately long expression rejected"
+    for bad_value in [{}, [[1]], "abc"]:
+        try:
+            ecu.evaluate_function("scale", {"gain": 2, "x": bad_value, "offset": 1})
+            raise AssertionError(f"Invalid input accepted: {bad_value!r}")
+        except ValueError:
+            pass
+    print("✅ register_function() and evaluate_function() work correctly")
+
     print("\n✅ ALL FMU MODEL TESTS PASSED!\n")
     
 except Exception as e:
@@ -71,7 +146,150 @@ try:
     # Check if ECU instance exists
     assert hasattr(server, 'ecu'), "ECU instance not found in server"
     print("✅ ECU instance exists in server")
-    
+
+    # Test output formats
+    import asyncio
+    import base64
+    import json
+    from result_format import pack_msgpack
+
+    result = asyncio.run(server.handle_call_tool("perform_addition", {"a": 10, "b": 20}))
+    assert result[0].text == "Addition Result: 10 + 20 = 30.0", "Text output changed"
+    result = asyncio.run(server.handle_call_tool(
+        "perform_addition", {"a": 10, "b": 20, "output_format": "json"}
+    ))
+    assert json.loads(result[0].text) == {"a": 10, "b": 20, "result": 30.0}, "JSON output mismatch"
+    result = asyncio.run(server.handle_call_tool(
+        "perform_addition", {"a": 10, "b": 20, "output_format": "binary"}
+    ))
+    assert result[0].resource.mimeType == "application/msgpack", "Binary MIME type mismatch"
+    assert base64.b64decode(result[0].resource.blob) == pack_msgpack(
+        {"a": 10, "b": 20, "result": 30.0}
+    ), "Binary output mismatch"
+    result = asyncio.run(server.handle_call_tool(
+        "perform_addition", {"a": 1e308, "b": 1e308, "output_format": "json"}
+    ))
+    assert json.loads(result[0].text)['result'] == "inf", "Non-finite JSON result mismatch"
+    assert pack_msgpack({"r": 1.0}) == b"\x81\xa1r\xcb\x3f\xf0" + b"\x00" * 6, "MessagePack encoding mismatch"
+    assert pack_msgpack(200) == b"\xcc\xc8", "uint8 encoding mismatch"
+    assert pack_msgpack(70000) == b"\xce\x00\x01\x11\x70", "uint32 encoding mismatch"
+    assert pack_msgpack(-200) == b"\xd1\xff\x38", "int16 encoding mismatch"
+    print("✅ text, json and binary output formats work correctly")
+
+    # Test user-defined function tools
+    asyncio.run(server.handle_call_tool(
+        "register_ecu_function", {"name": "double", "expression": "2 * x"}
+    ))
+    tool_names = [tool.name for tool in asyncio.run(server.handle_list_tools())]
+    assert "double" in tool_names, "Registered function not exposed as a tool"
+    result = asyncio.run(server.handle_call_tool(
+        "double", {"x": [1, 2], "output_format": "json"}
+    ))
+    assert json.loads(result[0].text) == {"function": "double", "result": [2.0, 4.0]}, \
+        "Function tool result mismatch"
+    print("✅ user-defined functions are exposed as tools")
+
+    # Test scheduler tool argument validation
+    for tool, arguments in [
+        ("get_task_timing", {"task": ["task_1ms"]}),
+        ("run_ecu_tasks", {"duration_ms": 1, "mode": "virtual", "reset_stats": "false"}),
+        ("run_ecu_tasks", {"duration_ms": "1", "mode": "virtual"}),
+    ]:
+        try:
+            asyncio.run(server.handle_call_tool(tool, arguments))
+            raise AssertionError(f"Invalid arguments accepted: {tool} {arguments}")
+        except ValueError:
+            pass
+    print("✅ scheduler tools validate their arguments")
+
+    # Test result cache
+    import tempfile
+    from result_cache import ResultCache, make_cache_key
+
+    assert make_cache_key("m", "t", {"a": 1, "b": 2}) == make_cache_key("m", "t", {"b": 2, "a": 1}), \
+        "Cache key depends on argument order"
+    assert make_cache_key("m@1", "t", {"a": 1}) != make_cache_key("m@2", "t", {"a": 1}), \
+        "Cache key ignores model identity"
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ResultCache(cache_dir, max_bytes=3 * 4096)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"result": 3.0}
+
+        async def concurrent_lookups():
+            return await asyncio.gather(*[cache.get_or_compute("k1", compute) for _ in range(3)])
+
+        results = asyncio.run(concurrent_lookups())
+        assert results == [{"result": 3.0}] * 3 and len(calls) == 1, "Single-flight failed"
+        assert asyncio.run(cache.get_or_compute("k1", compute)) == {"result": 3.0}, "Cache hit failed"
+
+        async def cancel_first_caller():
+            first = asyncio.ensure_future(cache.get_or_compute("k0", compute))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(cache.get_or_compute("k0", compute))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(cancel_first_caller()) == {"result": 3.0}, \
+            "Cancelling the first caller cancelled a coalesced waiter"
+        assert cache.get("k0") == {"result": 3.0}, "Result of cancelled caller not cached"
+        assert ResultCache(cache_dir).get("k1") == {"result": 3.0}, "Cache not persisted on disk"
+        for i in range(10):
+            cache.put(f"k{i + 2}", {"result": float(i)})
+        stats = cache.get_stats()
+        assert stats['hits'] == 1 and stats['misses'] == 2 and stats['coalesced'] == 3, \
+            f"Cache statistics mismatch: {stats}"
+        assert stats['bytes'] <= 3 * 4096 and stats['evictions'] > 0, "Cache size not bounded"
+        assert stats['entries'] <= 3, f"Cache size counts bytes written, not disk usage: {stats}"
+
+    # Test result cache shared between processes
+    with tempfile.TemporaryDirectory() as cache_dir:
+        stale = os.path.join(cache_dir, "stale.tmp")
+        open(stale, "w").close()
+        os.utime(stale, (0, 0))
+        first = ResultCache(cache_dir, max_bytes=5 * 4096, rescan_interval=0)
+        assert not os.path.exists(stale), "Stale temporary file not removed"
+        second = ResultCache(cache_dir, max_bytes=5 * 4096, rescan_interval=0)
+        for i in range(10):
+            first.put(f"a{i}", {"result": float(i)})
+            second.put(f"b{i}", {"result": float(i)})
+        total = sum(len(names) for _, _, names in os.walk(cache_dir))
+        assert total <= 6, f"Shared cache size not bounded: {total} entries"
+
+    # Test that non-finite arguments bypass the cache instead of failing
+    with tempfile.TemporaryDirectory() as cache_dir:
+        saved_cache = server.result_cache
+        server.result_cache = ResultCache(cache_dir)
+        try:
+            result = asyncio.run(server.handle_call_tool(
+                "perform_addition", {"a": float("inf"), "b": 1, "output_format": "json"}
+            ))
+            assert json.loads(result[0].text)["result"] == "inf", "Non-finite argument failed"
+            assert server.result_cache.get_stats()["entries"] == 0, "Non-finite argument cached"
+        finally:
+            server.result_cache = saved_cache
+    print("✅ ResultCache works correctly")
+
+    # Test that a bad cache configuration disables the cache instead of breaking the server
+    import subprocess
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for max_bytes in ["64MB", "0"]:
+            env = dict(os.environ, FMU_CACHE_DIR=cache_dir, FMU_CACHE_MAX_BYTES=max_bytes)
+            check = subprocess.run(
+                [sys.executable, "-c", "import server; print(server.result_cache)"],
+                env=env, capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            assert check.returncode == 0 and check.stdout.strip() == "None", \
+                f"Bad FMU_CACHE_MAX_BYTES={max_bytes} broke the server: {check.stderr}"
+            assert "cache disabled" in check.stderr, "Disabled cache not reported"
+    print("✅ Invalid cache configuration disables the cache")
+
     print("\n✅ ALL MCP SERVER STRUCTURE TESTS PASSED!\n")
     
 except Exception as e: